@@ -1,11 +1,20 @@
 # app.py
 import os
 import io
-import base64
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
+import pillow_heif
 from google import genai
 from google.genai import types
+from google.genai import errors
+
+# Let Image.open read HEIC/HEIF (iPhone photos); HDR images are converted to 8-bit
+pillow_heif.register_heif_opener()
 
 # ---------------------------
 # Config / Setup
@@ -21,133 +30,528 @@ if not GEMINI_KEY:
     st.error("Gemini API key not set. Set GEMINI_API_KEY in environment or in Streamlit secrets.")
     st.stop()
 
-# Initialize Gemini client (google-genai reads GEMINI_API_KEY env var automatically)
-client = genai.Client()
+# Longest side (px) of the image we send to Gemini
+MAX_IMAGE_SIZE = (1568, 1568)
+
+# Multi-view mode: up to this many photos are spliced into one 2-column grid image
+MAX_VIEWS = 4
+
+# Retry policy for rate limits (429) and server errors (5xx)
+MAX_ATTEMPTS = 4
+MAX_RETRY_WAIT = 32  # seconds; also caps server-requested delays
+
+# Failed calls return/yield text starting with this instead of raising into the UI
+GEMINI_ERROR_PREFIX = "Error calling Gemini API:"
+
+# Shown when the model returns no text (e.g. a safety block)
+NO_ANSWER_TEXT = "The model returned no answer. Try again, or rephrase / re-take the photo."
+
+# ---------------------------
+# Cached resources (built once per server process, not on every rerun)
+# ---------------------------
+@st.cache_resource
+def get_client(api_key: str):
+    """
+    Build the Gemini client once and share it across reruns and sessions.
+    Keeping the one instance alive lets its pooled HTTP connections (and TLS
+    sessions) be reused by every call instead of re-handshaking per click.
+    """
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(timeout=60_000)  # milliseconds
+    )
+
+
+def make_generate_config(thinking_budget: int):
+    """
+    GenerateContentConfig for a given thinking budget.
+    """
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget)
+    )
+
+
+@st.cache_resource
+def get_generate_configs():
+    """
+    Configs for every thinking budget the UI can produce (200 for the diagnosis
+    default, plus the Reasoning depth slider's 0-1024 steps), built once per process.
+    """
+    budgets = {200, *range(0, 1025, 64)}
+    return {b: make_generate_config(b) for b in budgets}
+
+
+def get_generate_config(thinking_budget: int):
+    """
+    Precomputed config for thinking_budget (plain dict lookup, so it is also
+    safe from worker threads); unexpected budgets get a freshly built one.
+    """
+    return GENERATE_CONFIGS.get(thinking_budget) or make_generate_config(thinking_budget)
+
+
+client = get_client(GEMINI_KEY)
+GENERATE_CONFIGS = get_generate_configs()
+
+# ---------------------------
+# Prompts for the three buttons (static, so defined once at module level)
+# ---------------------------
+
+# 1) Find disease (prebuilt instruction)
+PROMPT_FIND_DISEASE = (
+    "You are an expert plant pathologist and agronomist. Analyze the supplied image and:\n"
+    "1) Name the most likely disease(s) or disorder(s) (be explicit about uncertainty).\n"
+    "2) List the visible symptoms you see (e.g., leaf spots, lesions, discoloration, wilting) linked to the image.\n"
+    "3) Suggest the most probable causal agent (fungus, bacteria, virus, nutrient deficiency, abiotic stress) and why.\n"
+    "4) Provide a short confidence estimate (low/medium/high) and what additional observations or simple tests would increase confidence.\n"
+    "Answer concisely in bullet points and prioritize actionable diagnostic clues."
+)
+
+# 2) Suggestions & advice (prebuilt instruction)
+PROMPT_SUGGESTIONS = (
+    "You are an experienced crop protection specialist. Based on the supplied image and"
+    " likely disease/disorder, provide practical control and management advice in order:\n"
+    "A) Immediate short-term actions (isolation, sanitation, removal of affected tissue).\n"
+    "B) Cultural and non-chemical solutions (crop rotation, irrigation changes, pruning, resistant varieties).\n"
+    "C) If chemical control is recommended: list pesticide types (active ingredient classes), approximate application rates or guidance (give ranges), and safety/environmental precautions.\n"
+    "D) Monitoring plan: what to watch for, when to re-check, and when to seek lab confirmation.\n"
+    "End with a short list of low-cost confirmatory tests or photos to take for diagnosis."
+)
+
+# 3) Custom prompt wrapper; {question} is filled in with the user's text
+PROMPT_CUSTOM_TEMPLATE = (
+    "You are a helpful plant pathology assistant. Use the image to inform your answer.\n\n"
+    "User question: {question}\n\n"
+    "Provide a concise, practical answer and list any assumptions you made."
+)
+
+# Prepended to every prompt when several photos were spliced into one grid image
+PROMPT_MULTI_VIEW_NOTE = (
+    "The supplied image is a grid of {n} photos of the same plant, labeled 1 to {n} "
+    "from top-left to bottom-right. Use all views and refer to them by number.\n\n"
+)
+
+# ---------------------------
+# Helper: image preparation
+# ---------------------------
+def open_rgb(image: Image.Image, max_size: tuple) -> Image.Image:
+    """
+    Decode a (lazily opened) PIL image to RGB, downscaled to fit within max_size.
+    """
+    if image.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below the size thumbnail
+        # will produce); must happen before anything loads the full-resolution pixels.
+        # Pass the aspect-preserving target: with the square box the short side decides
+        # the scale and a 4000x3000 photo would not be reduced at all
+        scale = min(max_size[0] / image.width, max_size[1] / image.height)
+        if scale < 1:
+            image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+    rgb = image.convert("RGB")
+    rgb.thumbnail(max_size, Image.Resampling.BILINEAR)
+    return rgb
+
+
+def encode_webp(rgb: Image.Image) -> bytes:
+    """
+    Encode an RGB PIL image as quality-80 WebP bytes.
+    WebP is ~25-35% smaller than JPEG at similar quality, so uploads are faster;
+    method=4 balances encode speed against compression (6 is ~2x slower for ~5% gain).
+    """
+    buf = io.BytesIO()
+    rgb.save(buf, format="WEBP", quality=80, method=4)
+    return buf.getvalue()
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def prepare_image(raw: bytes):
+    """
+    Turn the uploaded file bytes into the image bytes we send to Gemini.
+    Cached on the raw bytes, so button clicks (reruns) skip decode/resize/encode.
+    Returns: (image_bytes, (width, height)) of the prepared image.
+    """
+    image = Image.open(io.BytesIO(raw))
+    fits = image.width <= MAX_IMAGE_SIZE[0] and image.height <= MAX_IMAGE_SIZE[1]
+    if image.format == "JPEG" and fits and len(raw) < 10 * 1024 * 1024:
+        # Already a reasonably sized JPEG: send as-is, no decode/re-encode quality loss
+        return raw, image.size
+
+    # Re-encode as WebP (Gemini accepts image/webp; the MIME is detected on upload)
+    # Gemini tiles images at 768px; 1568px keeps ~2x detail while shrinking big phone photos a lot
+    rgb = open_rgb(image, MAX_IMAGE_SIZE)
+    return encode_webp(rgb), rgb.size
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def prepare_multi_view(raws: tuple):
+    """
+    Splice several uploaded photos into one labeled grid image (2 columns,
+    numbered 1..N top-left to bottom-right) so they go to Gemini in one request.
+    Returns: (image_bytes, (width, height)) of the composite.
+    """
+    cols = 2
+    rows = (len(raws) + cols - 1) // cols
+    tile_w, tile_h = MAX_IMAGE_SIZE[0] // cols, MAX_IMAGE_SIZE[1] // cols
+    grid = Image.new("RGB", (tile_w * cols, tile_h * rows), "white")
+    draw = ImageDraw.Draw(grid)
+    font = ImageFont.load_default(size=tile_h // 12)
+
+    for i, raw in enumerate(raws):
+        tile = open_rgb(Image.open(io.BytesIO(raw)), (tile_w, tile_h))
+        x, y = (i % cols) * tile_w, (i // cols) * tile_h
+        # Center each view in its cell
+        grid.paste(tile, (x + (tile_w - tile.width) // 2, y + (tile_h - tile.height) // 2))
+        label = str(i + 1)
+        box = draw.textbbox((x + 8, y + 8), label, font=font)
+        draw.rectangle((box[0] - 6, box[1] - 6, box[2] + 6, box[3] + 6), fill="black")
+        draw.text((x + 8, y + 8), label, fill="white", font=font)
+
+    return encode_webp(grid), grid.size
+
+# ---------------------------
+# Helper: retries with exponential backoff
+# ---------------------------
+def is_retryable(e: Exception) -> bool:
+    """
+    True for transient Gemini errors: 429 (rate limit / quota) and 5xx.
+    """
+    return isinstance(e, errors.APIError) and (e.code == 429 or (e.code or 0) >= 500)
+
+
+def get_retry_delay(e: errors.APIError, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt. Honors the server's Retry-After
+    header or google.rpc.RetryInfo delay when present, else 1, 2, 4, ... s with jitter.
+    """
+    headers = getattr(e.response, "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), MAX_RETRY_WAIT)
+    except (TypeError, ValueError):
+        pass
+
+    body = e.details if isinstance(e.details, dict) else {}
+    body = body.get("error", body)
+    for detail in body.get("details", []):
+        if str(detail.get("@type", "")).endswith("RetryInfo"):
+            try:
+                # Protobuf duration string, e.g. "7s" or "7.5s"
+                return min(float(str(detail.get("retryDelay", "")).rstrip("s")), MAX_RETRY_WAIT)
+            except ValueError:
+                break
+
+    return min(2 ** attempt, MAX_RETRY_WAIT) + random.uniform(0, 1)
+
+
+def with_retries(fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs), retrying transient errors up to MAX_ATTEMPTS times.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return fn(*args, **kwargs)
+        except errors.APIError as e:
+            if not is_retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(get_retry_delay(e, attempt))
+
+# ---------------------------
+# Helper: upload image once via the Files API
+# ---------------------------
+def delete_gemini_file():
+    """
+    Delete the image previously uploaded to the Gemini Files API (if any)
+    and forget it in the session state.
+    """
+    uploaded = st.session_state.pop("gemini_file", None)
+    st.session_state.pop("gemini_file_key", None)
+    if uploaded is not None:
+        try:
+            client.files.delete(name=uploaded.name)
+        except Exception:
+            # Files expire on their own after 48h; nothing else to do
+            pass
+
+
+def gemini_file_expired(uploaded) -> bool:
+    """
+    True if the Files API copy has expired (files live 48h) or will within a few minutes.
+    """
+    expires = getattr(uploaded, "expiration_time", None)
+    if expires is None:
+        return False
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires <= datetime.now(timezone.utc) + timedelta(minutes=5)
+
+
+def get_gemini_file(image_bytes: bytes):
+    """
+    Upload image_bytes to the Gemini Files API once per session and image.
+    The file handle is kept in st.session_state keyed by the SHA-256 of the
+    bytes, so repeated button clicks reuse it instead of re-sending the image.
+    An expired handle (long-lived session) is replaced by a fresh upload.
+    """
+    key = hashlib.sha256(image_bytes).hexdigest()
+    if st.session_state.get("gemini_file_key") != key or gemini_file_expired(st.session_state["gemini_file"]):
+        # New or expired image: drop the stale remote copy first
+        delete_gemini_file()
+        # Detect the real format from the header rather than assuming JPEG
+        fmt = Image.open(io.BytesIO(image_bytes)).format
+        # Fresh buffer per attempt: a failed try may have consumed part of the last one
+        uploaded = with_retries(lambda: client.files.upload(
+            file=io.BytesIO(image_bytes),
+            config={"mime_type": Image.MIME.get(fmt, "image/jpeg")}
+        ))
+        st.session_state["gemini_file"] = uploaded
+        st.session_state["gemini_file_key"] = key
+    return st.session_state["gemini_file"]
 
 # ---------------------------
 # Sidebar: upload + options
 # ---------------------------
 with st.sidebar:
     st.header("Upload image")
-    uploaded_file = st.file_uploader("Choose a plant image (leaf, stem, fruit). Recommended: clear, focused photo.", type=["jpg","jpeg","png","webp","heic"])
+    uploaded_files = st.file_uploader("Choose a plant image (leaf, stem, fruit). Recommended: clear, focused photo.", type=["jpg","jpeg","png","webp","heic","heif"],
+                                      accept_multiple_files=True,
+                                      help=f"Select up to {MAX_VIEWS} photos (e.g. close-up + whole plant); they are combined into one image for a single analysis.")
     st.markdown("---")
     st.markdown("**Image Notes / Tips**\n- Take close-up of the symptomatic area\n- Include overall plant view + close leaf detail if possible\n- Avoid excessive blurring or shadows")
     st.markdown("---")
-    st.caption("If your image is > 10–15MB, consider resizing before upload (browser / phone).")
+    st.caption("Large photos are downscaled automatically before analysis; no need to resize them yourself.")
+    st.markdown("---")
+    reasoning_depth = st.slider(
+        "Reasoning depth", 0, 1024, 0, step=64,
+        help="Thinking budget (tokens) for the model. Higher can improve tricky diagnoses but answers take longer."
+    )
+    if st.session_state.get("gemini_file") is not None:
+        if st.button("🗑️ Remove image from Gemini"):
+            delete_gemini_file()
+            st.success("Uploaded image removed from Gemini storage.")
 
 # ---------------------------
 # Helper: send image + prompt to Gemini
 # ---------------------------
-def call_gemini_with_image(image_bytes: bytes, prompt_text: str, thinking_budget: int = 0):
+def generate_with_file(img_file, prompt_text: str, thinking_budget: int = 0):
     """
-    Send image (inline bytes) and prompt_text to Gemini 2.5-flash.
+    Blocking Gemini 2.5-flash call on an already uploaded file handle.
+    Transient errors (429/5xx) are retried with backoff; others are raised.
+    Doesn't touch st.session_state, so it is safe to run from worker threads.
     Returns: text output from model (string).
     """
+    # The prompt text should come after the image part per best practice
+    contents = [img_file, prompt_text]
+
+    # Optionally you can set thinking_budget>0 to enable model "thinking"
+    cfg = get_generate_config(thinking_budget)
+
+    response = with_retries(
+        client.models.generate_content,
+        model="gemini-2.5-flash",
+        contents=contents,
+        config=cfg
+    )
+    return response.text
+
+
+def stream_gemini_with_image(image_bytes: bytes, prompt_text: str, thinking_budget: int = 0):
+    """
+    Send image (as an uploaded Files API handle) and prompt_text to Gemini 2.5-flash, streamed.
+    Yields: text chunks as the model produces them.
+    """
     try:
-        # Build parts: image part + text part
-        img_part = types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg")
-        # The prompt text should come after the image part per best practice
-        contents = [img_part, prompt_text]
-
-        # Optionally you can set thinking_budget>0 to enable model "thinking"
-        cfg = types.GenerateContentConfig(
-            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget)
-        )
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=contents,
-            config=cfg
-        )
-        return response.text
+        img_file = get_gemini_file(image_bytes)
+        contents = [img_file, prompt_text]
+        cfg = get_generate_config(thinking_budget)
+
+        for attempt in range(MAX_ATTEMPTS):
+            started = False
+            try:
+                stream = client.models.generate_content_stream(
+                    model="gemini-2.5-flash",
+                    contents=contents,
+                    config=cfg
+                )
+                for chunk in stream:
+                    # Chunks carrying only thinking/metadata have no text
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+                return
+            except errors.APIError as e:
+                # Once text is on screen a retry would duplicate it, so give up
+                if started or not is_retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(get_retry_delay(e, attempt))
     except Exception as e:
-        return f"Error calling Gemini API: {e}"
+        yield f"{GEMINI_ERROR_PREFIX} {e}"
+
+
+def write_stream_with_spinner(chunks, spinner_text: str):
+    """
+    Show a spinner only until the first chunk arrives, then render the rest
+    of the stream live. Returns the full text written.
+    """
+    with st.spinner(spinner_text):
+        first = next(chunks, "")
+
+    def gen():
+        yield first
+        yield from chunks
+
+    return st.write_stream(gen())
+
+
+def answer_prompt(img_hash: str, image_bytes: bytes, prompt_text: str, thinking_budget: int, spinner_text: str):
+    """
+    Stream the answer for prompt_text, memoized per (image hash, prompt, thinking budget)
+    in st.session_state so repeat clicks don't pay for another Gemini round trip.
+    Returns: the full answer text.
+    """
+    cache = st.session_state.setdefault("response_cache", {})
+    key = (img_hash, prompt_text, thinking_budget)
+    if key in cache:
+        st.write(cache[key])
+        return cache[key]
+
+    output = write_stream_with_spinner(
+        stream_gemini_with_image(image_bytes, prompt_text, thinking_budget=thinking_budget),
+        spinner_text
+    )
+    if not output:
+        st.info(NO_ANSWER_TEXT)
+        return ""
+    # Don't memoize failures; the next click should retry
+    if GEMINI_ERROR_PREFIX not in output:
+        cache[key] = output
+    return output
+
+
+def run_all_analyses(img_hash: str, image_bytes: bytes, prompts: dict):
+    """
+    Answer several prompts about the same image concurrently.
+    prompts maps a section title to (prompt_text, thinking_budget).
+    Answers already memoized by answer_prompt are reused; new ones are stored.
+    Returns: dict of section title -> answer text ("" if the model gave none), in the order of prompts.
+    """
+    cache = st.session_state.setdefault("response_cache", {})
+    results = {}
+    pending = {}
+    for name, (prompt_text, budget) in prompts.items():
+        key = (img_hash, prompt_text, budget)
+        if key in cache:
+            results[name] = cache[key]
+        else:
+            pending[name] = (prompt_text, budget)
+
+    if pending:
+        try:
+            # Upload in the script thread; workers only get the file handle
+            img_file = get_gemini_file(image_bytes)
+        except Exception as e:
+            error = f"{GEMINI_ERROR_PREFIX} {e}"
+            return {name: results.get(name, error) for name in prompts}
+
+        # The API call is I/O-bound, so threads give us real overlap
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            futs = {name: ex.submit(generate_with_file, img_file, p, b) for name, (p, b) in pending.items()}
+        for name, fut in futs.items():
+            try:
+                # response.text is None when the model returns no text
+                results[name] = fut.result() or ""
+                if results[name]:
+                    prompt_text, budget = pending[name]
+                    cache[(img_hash, prompt_text, budget)] = results[name]
+            except Exception as e:
+                results[name] = f"{GEMINI_ERROR_PREFIX} {e}"
+
+    return {name: results[name] for name in prompts}
 
 # ---------------------------
 # UI: Show uploaded image
 # ---------------------------
-if uploaded_file:
+if uploaded_files:
+    if len(uploaded_files) > MAX_VIEWS:
+        st.warning(f"Only the first {MAX_VIEWS} photos are used.")
+        uploaded_files = uploaded_files[:MAX_VIEWS]
+    names = ", ".join(f.name for f in uploaded_files)
+
     try:
-        image = Image.open(uploaded_file)
+        if len(uploaded_files) == 1:
+            image_bytes, image_size = prepare_image(uploaded_files[0].getvalue())
+        else:
+            # One composite image = one upload and one request per action
+            image_bytes, image_size = prepare_multi_view(tuple(f.getvalue() for f in uploaded_files))
     except Exception as e:
         st.error(f"Couldn't open image: {e}")
         st.stop()
+    img_hash = hashlib.sha256(image_bytes).hexdigest()
 
-    # Display image
-    st.image(image, use_column_width=True, caption=f"Uploaded: {uploaded_file.name}")
+    # Display the prepared image (already-encoded bytes; browsers can't show HEIC anyway)
+    st.image(image_bytes, width="stretch",
+             caption=f"Uploaded: {names} ({image_size[0]}×{image_size[1]} sent for analysis)")
 
-    # Convert to JPEG bytes (Gemini examples prefer JPEG; ensures consistent mime)
-    buf = io.BytesIO()
-    rgb = image.convert("RGB")
-    rgb.save(buf, format="JPEG", quality=90)
-    image_bytes = buf.getvalue()
-
-    # Quick sanity size check
-    size_mb = len(image_bytes) / (1024 * 1024)
-    if size_mb > 18:
-        st.warning(f"Image size {size_mb:.1f} MB — close to the inline limit (~20MB). Consider resizing for reliability.")
-
-    # ---------------------------
-    # Prompts for the three buttons
-    # ---------------------------
-
-    # 1) Find disease (prebuilt instruction)
-    prompt_find_disease = (
-        "You are an expert plant pathologist and agronomist. Analyze the supplied image and:\n"
-        "1) Name the most likely disease(s) or disorder(s) (be explicit about uncertainty).\n"
-        "2) List the visible symptoms you see (e.g., leaf spots, lesions, discoloration, wilting) linked to the image.\n"
-        "3) Suggest the most probable causal agent (fungus, bacteria, virus, nutrient deficiency, abiotic stress) and why.\n"
-        "4) Provide a short confidence estimate (low/medium/high) and what additional observations or simple tests would increase confidence.\n"
-        "Answer concisely in bullet points and prioritize actionable diagnostic clues."
-    )
-
-    # 2) Suggestions & advice (prebuilt instruction)
-    prompt_suggestions = (
-        "You are an experienced crop protection specialist. Based on the supplied image and"
-        " likely disease/disorder, provide practical control and management advice in order:\n"
-        "A) Immediate short-term actions (isolation, sanitation, removal of affected tissue).\n"
-        "B) Cultural and non-chemical solutions (crop rotation, irrigation changes, pruning, resistant varieties).\n"
-        "C) If chemical control is recommended: list pesticide types (active ingredient classes), approximate application rates or guidance (give ranges), and safety/environmental precautions.\n"
-        "D) Monitoring plan: what to watch for, when to re-check, and when to seek lab confirmation.\n"
-        "End with a short list of low-cost confirmatory tests or photos to take for diagnosis."
-    )
+    # Multi-view: tell the model how the grid is laid out
+    view_note = PROMPT_MULTI_VIEW_NOTE.format(n=len(uploaded_files)) if len(uploaded_files) > 1 else ""
+    prompt_find_disease = view_note + PROMPT_FIND_DISEASE
+    prompt_suggestions = view_note + PROMPT_SUGGESTIONS
 
     # 3) Custom prompt (user-supplied)
     custom_user_prompt = st.text_input("Custom question about this image (use this with 'Ask (custom prompt)')",
                                       placeholder="e.g. 'What lab test should I run to confirm fungal infection?'")
 
+    combined_prompt = view_note + PROMPT_CUSTOM_TEMPLATE.format(question=custom_user_prompt)
+
+    # Thinking budgets: thinking tokens add directly to response time, so only the
+    # diagnosis keeps a small default; the rest think only if the user asks for it
+    budget_find_disease = max(200, reasoning_depth)
+    budget_suggestions = reasoning_depth
+    budget_custom = reasoning_depth
+
     # Buttons
     st.markdown("### Actions")
     col1, col2, col3 = st.columns(3)
 
     with col1:
         if st.button("🔬 Find disease (auto)"):
-            with st.spinner("Analyzing image for likely disease..."):
-                output = call_gemini_with_image(image_bytes, prompt_find_disease, thinking_budget=500)  # moderate thinking budget
             st.subheader("Likely disease(s) & diagnostic clues")
-            st.write(output)
+            answer_prompt(
+                img_hash, image_bytes, prompt_find_disease, budget_find_disease,
+                "Analyzing image for likely disease..."
+            )
 
     with col2:
         if st.button("🩺 Suggestions & Advice"):
-            with st.spinner("Generating management suggestions and safety advice..."):
-                output = call_gemini_with_image(image_bytes, prompt_suggestions, thinking_budget=400)
             st.subheader("Practical suggestions & monitoring plan")
-            st.write(output)
+            answer_prompt(
+                img_hash, image_bytes, prompt_suggestions, budget_suggestions,
+                "Generating management suggestions and safety advice..."
+            )
 
     with col3:
         if st.button("❓ Ask (custom prompt)"):
             if not custom_user_prompt.strip():
                 st.warning("Please enter a custom prompt in the text box before clicking this button.")
             else:
-                combined_prompt = (
-                    "You are a helpful plant pathology assistant. Use the image to inform your answer.\n\n"
-                    f"User question: {custom_user_prompt}\n\n"
-                    "Provide a concise, practical answer and list any assumptions you made."
-                )
-                with st.spinner("Asking the model about your custom question..."):
-                    output = call_gemini_with_image(image_bytes, combined_prompt, thinking_budget=200)
                 st.subheader("Model answer to your question")
+                answer_prompt(
+                    img_hash, image_bytes, combined_prompt, budget_custom,
+                    "Asking the model about your custom question..."
+                )
+
+    # Run everything at once: wall-clock time is the slowest call, not the sum
+    if st.button("⚡ Run all analyses"):
+        prompts = {
+            "Likely disease(s) & diagnostic clues": (prompt_find_disease, budget_find_disease),
+            "Practical suggestions & monitoring plan": (prompt_suggestions, budget_suggestions),
+        }
+        if custom_user_prompt.strip():
+            prompts["Model answer to your question"] = (combined_prompt, budget_custom)
+        with st.spinner("Running all analyses in parallel..."):
+            outputs = run_all_analyses(img_hash, image_bytes, prompts)
+        for name, output in outputs.items():
+            st.subheader(name)
+            if output:
                 st.write(output)
+            else:
+                st.info(NO_ANSWER_TEXT)
 
     # Footer: small note
     st.markdown("---")